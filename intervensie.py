@@ -2,10 +2,21 @@ import streamlit as st
 import pandas as pd
 import os
 from datetime import datetime, timedelta, time
+from time import monotonic, sleep, strftime
 from docx import Document
 from docx.shared import Inches
-from github import Github
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from github import Auth, Github, GithubException, UnknownObjectException
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from PIL import Image, ImageOps
+import atexit
+import csv
+import hashlib
+import shutil
+import threading
 import uuid
 
 # ---------------- Config ---------------- #
@@ -198,149 +209,488 @@ st.markdown(
 
 # Constants
 CSV_FILE = "intervensie_database.csv"
+PARQUET_FILE = "intervensie_database.parquet"  # Local typed mirror of CSV_FILE for fast loads
 LOG_FILE = "app_log.csv"
+LOG_COLUMNS = ["Timestamp", "Action", "Details", "Status"]
+LOG_FLUSH_SIZE = 32  # Pending log rows that force a flush
+LOG_FLUSH_INTERVAL = 0.5  # Seconds between flushes while logging
+GITHUB_SYNC_DELAY = 2  # Seconds the sync worker waits so a burst of writes becomes one push
 ERROR_LOG_FILE = "error_log.txt"
 FOTO_DIR = "fotos"
 PRES_DIR = "presensies"
 GRADE_OPTIONS = ["8", "9", "10", "11", "12"]
+FILTER_DAYS = {"Weekliks": 7, "Maandeliks": 30, "Kwartaalliks": 90, "Jaarliks": 365}
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Stream uploads to disk in 1 MB chunks
+THUMB_MAX_WIDTH = 400  # Pixel width of the report thumbnails (2 inches in Word)
+REPORT_PREFETCH_WORKERS = 8  # Threads reading report attachments from disk
+# Fields the report's detail section reads; all are valid identifiers for itertuples
+DETAIL_COLUMNS = [
+    "Datum", "Vak", "Begintyd", "Eindtyd", "Foto", "FotoThumb",
+    "Presensielys_Foto", "Presensielys_FotoThumb", "Presensielys_Dokument"
+]
+
+# Projection for the dashboard, sidebar options and deletion labels only; the report loads every column
+INTERVENTION_COLUMNS = [
+    "Datum", "Graad", "Vak", "Tema", "Begintyd", "Eindtyd",
+    "Totaal Genooi", "Totaal Opgedaag", "Opvoeder", "Aanwesigheid %"
+]
+CATEGORY_DTYPES = {"Graad": "category", "Vak": "category", "Opvoeder": "category"}
 
 # Initialize directories and CSV
-for directory in [FOTO_DIR, PRES_DIR]:
-    os.makedirs(directory, exist_ok=True)
+def _maybe_create_header(path, columns):
+    if not os.path.exists(path):
+        with open(path, "w", newline="") as f:
+            csv.writer(f, lineterminator="\n").writerow(columns)
 
-if not os.path.exists(CSV_FILE):
-    pd.DataFrame(columns=[
-        "Datum", "Graad", "Vak", "Tema", "Begintyd", "Eindtyd", 
-        "Totaal Genooi", "Totaal Opgedaag", "Opvoeder", "Foto", 
+@st.cache_resource
+def _ensure_layout():
+    """Create the upload folders and the CSV headers once per process, not on every rerun."""
+    for directory in [FOTO_DIR, PRES_DIR]:
+        os.makedirs(directory, exist_ok=True)
+    _maybe_create_header(CSV_FILE, [
+        "Datum", "Graad", "Vak", "Tema", "Begintyd", "Eindtyd",
+        "Totaal Genooi", "Totaal Opgedaag", "Opvoeder", "Foto",
         "Presensielys_Foto", "Presensielys_Dokument"
-    ]).to_csv(CSV_FILE, index=False)
+    ])
+    _maybe_create_header(LOG_FILE, LOG_COLUMNS)
+    return True
 
-if not os.path.exists(LOG_FILE):
-    pd.DataFrame(columns=["Timestamp", "Action", "Details", "Status"]).to_csv(LOG_FILE, index=False)
+_ensure_layout()
 
 # ---------------- Log Functions ---------------- #
+@st.cache_resource
+def _log_buffer():
+    """Process-wide buffer of pending log rows; survives reruns and is flushed at exit."""
+    buffer = {"lock": threading.Lock(), "rows": [], "last_flush": monotonic()}
+    atexit.register(flush_log, buffer)
+    return buffer
+
+def flush_log(buffer=None):
+    """Write all pending log rows to the CSV log file in a single append."""
+    buffer = buffer or _log_buffer()
+    with buffer["lock"]:
+        rows, buffer["rows"] = buffer["rows"], []
+        buffer["last_flush"] = monotonic()
+        if not rows:
+            return True
+        try:
+            with open(LOG_FILE, "a", newline="", buffering=8192) as f:
+                writer = csv.writer(f, lineterminator="\n")
+                if f.tell() == 0:
+                    writer.writerow(LOG_COLUMNS)
+                writer.writerows(rows)
+            return True
+        except Exception as e:
+            st.error(f"⚠️ Fout met log stoor: {str(e)}")
+            with open(ERROR_LOG_FILE, "a") as f:
+                f.write(f"Log save failed: {str(e)} at {strftime('%Y-%m-%d %H:%M:%S')}\n")
+            return False
+
 def log_action(action, details="", status="INFO"):
-    """Log actions to CSV file."""
-    log_entry = {
-        "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "Action": action,
-        "Details": details,
-        "Status": status
-    }
-    try:
-        df_log = pd.read_csv(LOG_FILE)
-        df_log = pd.concat([df_log, pd.DataFrame([log_entry])], ignore_index=True)
-        df_log.to_csv(LOG_FILE, index=False)
-        return True
-    except Exception as e:
-        st.error(f"⚠️ Fout met log stoor: {str(e)}")
-        with open(ERROR_LOG_FILE, "a") as f:
-            f.write(f"Log save failed: {str(e)} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        return False
+    """Queue one action for the CSV log; flushed once enough rows or time have built up."""
+    buffer = _log_buffer()
+    with buffer["lock"]:
+        buffer["rows"].append([strftime("%Y-%m-%d %H:%M:%S"), action, details, status])
+        due = (len(buffer["rows"]) >= LOG_FLUSH_SIZE
+               or monotonic() - buffer["last_flush"] >= LOG_FLUSH_INTERVAL)
+    return flush_log(buffer) if due else True
+
+# Write whatever the previous run left in the buffer
+flush_log()
 
 # ---------------- GitHub Upload Function ---------------- #
+@st.cache_resource
+def get_repo(token, repo_name):
+    """Return a process-wide PyGithub repository handle, resolved once per token and repo."""
+    return Github(auth=Auth.Token(token), per_page=100, retry=3).get_repo(repo_name)
+
+@st.cache_resource
+def _pushed_hashes():
+    """Content hash of the last successful push per (repo, path), shared by the sync worker."""
+    return {}
+
+@st.cache_resource
+def _remote_shas():
+    """Last known blob sha per (repo, path) on GitHub, so updates can skip get_contents."""
+    return {}
+
 def upload_file_to_github(file_path, repo_name, path_in_repo, token):
-    """Upload or update a file in a GitHub repository using PyGithub."""
+    """Upload or update a file in a GitHub repository using PyGithub.
+
+    Runs on the background sync worker, so failures are logged rather than shown."""
     try:
         log_action("GitHub Upload Attempt", f"File: {path_in_repo}, Repo: {repo_name}", "INFO")
         if not token or token.strip() == "":
             log_action("GitHub Upload Failed", "Empty or missing token", "ERROR")
-            st.error("⚠️ GitHub token is leeg of ontbreek!")
             return False
 
-        g = Github(token)
-        repo = g.get_repo(repo_name)
-
         if not os.path.exists(file_path):
             log_action("GitHub Upload Failed", f"Local file not found: {file_path}", "ERROR")
-            st.error(f"⚠️ Lokale lêer nie gevind nie: {file_path}")
             return False
 
         with open(file_path, "rb") as file:
             content = file.read()
 
+        # Skip the push when this exact content was already uploaded
+        content_hash = hashlib.sha1(content).hexdigest()
+        last_push = _pushed_hashes()
+        if last_push.get((repo_name, path_in_repo)) == content_hash:
+            log_action("GitHub Upload Skipped", f"No changes since last push: {path_in_repo}", "INFO")
+            return True
+
+        repo = get_repo(token, repo_name)
+
         repo_path = path_in_repo
-        try:
-            contents = repo.get_contents(repo_path, ref="master")
-            repo.update_file(
+        shas = _remote_shas()
+        sha = shas.get((repo_name, repo_path))
+        if sha is None:
+            try:
+                sha = repo.get_contents(repo_path, ref="master").sha
+            except UnknownObjectException:
+                pass
+
+        def update(sha):
+            result = repo.update_file(
                 path=repo_path,
                 message=f"Updated {repo_path} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
                 content=content,
-                sha=contents.sha,
+                sha=sha,
                 branch="master"
             )
             log_action("GitHub Upload Success", f"Updated existing file: {repo_path}", "SUCCESS")
-        except Exception:
-            repo.create_file(
+            return result
+
+        def create():
+            result = repo.create_file(
                 path=repo_path,
                 message=f"Created {repo_path} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
                 content=content,
                 branch="master"
             )
             log_action("GitHub Upload Success", f"Created new file: {repo_path}", "SUCCESS")
+            return result
+
+        if sha is None:
+            result = create()
+        else:
+            try:
+                result = update(sha)
+            except GithubException as e:
+                if e.status not in (404, 409, 422):
+                    raise
+                # The cached sha is stale: refresh it and retry once, or recreate the file if it is gone
+                shas.pop((repo_name, repo_path), None)
+                try:
+                    fresh_sha = repo.get_contents(repo_path, ref="master").sha
+                except UnknownObjectException:
+                    result = create()
+                else:
+                    result = update(fresh_sha)
+        shas[(repo_name, repo_path)] = result["content"].sha
+        last_push[(repo_name, path_in_repo)] = content_hash
         return True
     except Exception as e:
+        # Never keep a sha that may be stale after a failed push
+        _remote_shas().pop((repo_name, path_in_repo), None)
         error_msg = str(e)
         log_action("GitHub Upload Failed", f"Error: {error_msg}", "ERROR")
         with open(ERROR_LOG_FILE, "a") as f:
-            f.write(f"GitHub push failed: {error_msg} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        st.error(f"⚠️ GitHub upload misluk: {error_msg}")
+            f.write(f"GitHub push failed: {error_msg} at {strftime('%Y-%m-%d %H:%M:%S')}\n")
         return False
 
-# ---------------- Helper: safe read attendance file ---------------- #
-def read_presensie_to_table(path, max_rows=50):
-    """Try to convert a CSV/XLSX presensielys into a pandas DataFrame for insertion into Word."""
+@st.cache_resource
+def _gh_config():
+    """Read and validate the GitHub token and repo once per process; None when either is missing."""
     try:
-        ext = path.split('.')[-1].lower()
-        if ext == 'csv':
-            df_p = pd.read_csv(path)
-        elif ext in ['xls', 'xlsx']:
-            df_p = pd.read_excel(path)
-        else:
-            return None
-        if df_p.shape[0] > max_rows:
-            return df_p.iloc[:max_rows]
-        return df_p
+        token = st.secrets.get("GITHUB_TOKEN")
+        repo = st.secrets.get("GITHUB_REPO")
     except Exception as e:
-        log_action("Presensie Read Failed", f"{path} - {str(e)}", "WARNING")
+        log_action("GitHub Secrets Error", f"Secrets unavailable: {str(e)}", "ERROR")
         return None
+    if not token or not token.strip() or not repo:
+        log_action("GitHub Config Missing", f"Token: {bool(token)}, Repo: {bool(repo)}", "WARNING")
+        return None
+    return token, repo
+
+# ---------------- Background GitHub Sync ---------------- #
+@st.cache_resource
+def _github_sync():
+    """Start the single background worker that pushes pending files to GitHub.
+
+    Jobs are keyed on (repo, path), so repeated writes of the same file while a
+    push is pending collapse into one upload of its latest content."""
+    sync = {"pending": {}, "status": {}, "cond": threading.Condition()}
+
+    def worker():
+        while True:
+            with sync["cond"]:
+                while not sync["pending"]:
+                    sync["cond"].wait()
+            sleep(GITHUB_SYNC_DELAY)
+            with sync["cond"]:
+                jobs, sync["pending"] = sync["pending"], {}
+            for (repo_name, path_in_repo), (file_path, token) in jobs.items():
+                try:
+                    ok = upload_file_to_github(file_path, repo_name, path_in_repo, token)
+                    if ok:
+                        log_action("Sync Complete", f"Synced {path_in_repo}", "SUCCESS")
+                    else:
+                        log_action("Sync Incomplete", "GitHub sync failed but data saved locally", "WARNING")
+                except Exception as e:
+                    ok = False
+                    log_action("GitHub Unexpected Error", f"Sync error: {str(e)}", "ERROR")
+                sync["status"].update(ok=ok, file=path_in_repo, time=strftime("%Y-%m-%d %H:%M:%S"))
+
+    threading.Thread(target=worker, name="github-sync", daemon=True).start()
+    return sync
+
+def queue_github_sync(file_path, repo_name, path_in_repo, token):
+    """Hand a file to the background GitHub worker and return immediately."""
+    sync = _github_sync()
+    with sync["cond"]:
+        sync["pending"][(repo_name, path_in_repo)] = (file_path, token)
+        sync["cond"].notify()
+
+# ---------------- Helper: append database entry ---------------- #
+def append_entry(path, entry):
+    """Append one entry to the database CSV as a single line.
+
+    The file is only rewritten when the entry has columns the existing header lacks."""
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), [])
+    if not header or not set(entry) <= set(header):
+        # Read every cell as text so existing rows keep their exact values; only columns are added
+        df = pd.read_csv(path, dtype=str, keep_default_na=False) if header else pd.DataFrame()
+        pd.concat([df, pd.DataFrame([entry])], ignore_index=True).to_csv(path, index=False)
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+    with open(path, "a", newline="") as f:
+        csv.DictWriter(f, fieldnames=header, lineterminator="\n").writerow(entry)
+
+# ---------------- Helper: report thumbnails ---------------- #
+def make_thumbnail(src_path, thumb_path):
+    """Save a small JPEG copy of an uploaded image for the Word report; returns its path or ""."""
+    try:
+        with Image.open(src_path) as original:
+            # Phone photos store their rotation in EXIF, which the JPEG copy would otherwise drop
+            img = ImageOps.exif_transpose(original)
+            img.thumbnail((THUMB_MAX_WIDTH, THUMB_MAX_WIDTH * 10))
+            if img.mode in ("RGBA", "LA", "P"):
+                # Flatten transparency onto white; a bare convert("RGB") turns it black
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, "white")
+                img.paste(rgba, mask=rgba.getchannel("A"))
+            img.convert("RGB").save(thumb_path, "JPEG", quality=80)
+        log_action("Thumbnail Save Success", f"Thumbnail saved: {thumb_path}", "SUCCESS")
+        return thumb_path
+    except Exception as e:
+        log_action("Thumbnail Save Failed", f"{src_path} - {str(e)}", "WARNING")
+        return ""
+
+def report_image_path(row, column):
+    """Return the thumbnail for an image column if it exists, else the original, else None."""
+    for path in (getattr(row, f"{column}Thumb", None), getattr(row, column, None)):
+        if pd.notna(path) and path and os.path.exists(path):
+            return path
+    return None
+
+# ---------------- Helper: Word table rows ---------------- #
+def append_table_rows(table, rows):
+    """Append rows of cell values to a Word table by cloning a prototype <w:tr>.
+
+    Skips table.add_row() and per-cell .text, which walk the XML tree for every cell;
+    the prototype is parsed once per row width and only its text nodes are filled in."""
+    tbl = table._tbl
+    prototypes = {}
+    for values in rows:
+        values = [str(v) for v in values]
+        proto = prototypes.get(len(values))
+        if proto is None:
+            cell = '<w:tc><w:p><w:r><w:t xml:space="preserve"/></w:r></w:p></w:tc>'
+            proto = prototypes[len(values)] = parse_xml(f"<w:tr {nsdecls('w')}>{cell * len(values)}</w:tr>")
+        tr = deepcopy(proto)
+        for r, value in zip(list(tr.iter(qn("w:r"))), values):
+            if "\n" in value or "\r" in value or "\t" in value:
+                # Same as _Cell.text: line breaks become <w:br/> and tabs <w:tab/>
+                r.text = value
+            else:
+                r[0].text = value
+        tbl.append(tr)
+
+# ---------------- Helper: read attendance file ---------------- #
+def read_presensie_to_table(path, max_rows=50):
+    """Convert a CSV/XLSX presensielys into a pandas DataFrame for insertion into Word.
+
+    Raises on unreadable files; the caller reports the failure."""
+    return _read_presensie_cached(path, os.path.getmtime(path), max_rows)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _read_presensie_cached(path, mtime, max_rows):
+    ext = path.split('.')[-1].lower()
+    if ext == 'csv':
+        # Only the first rows make it into Word, so stop parsing there
+        return pd.read_csv(path, nrows=max_rows)
+    elif ext in ['xls', 'xlsx']:
+        return pd.read_excel(path, nrows=max_rows)
+    return None
+
+# ---------------- Helper: prefetch report attachments ---------------- #
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _image_bytes(path, mtime):
+    """Raw bytes of a report thumbnail, cached so regenerated reports skip the disk read."""
+    with open(path, "rb") as f:
+        return f.read()
+
+def prefetch_attachments(row):
+    """Read a record's image bytes and attendance table for the Word report.
+
+    Runs in a worker thread, so it never writes to the page or the log: a failed
+    read is returned as its exception and reported when the record is written."""
+    attachments = {}
+    for key, column in [("foto", "Foto"), ("pres_foto", "Presensielys_Foto")]:
+        path = report_image_path(row, column)
+        try:
+            if path and path == getattr(row, f"{column}Thumb", None):
+                attachments[key] = _image_bytes(path, os.path.getmtime(path))
+            elif path:
+                # Full-size originals of older entries are read fresh, never held in the cache
+                with open(path, "rb") as f:
+                    attachments[key] = f.read()
+            else:
+                attachments[key] = None
+        except Exception as e:
+            attachments[key] = e
+
+    attachments["pres_table"] = None
+    pres_path = row.Presensielys_Dokument
+    if pd.notna(pres_path) and os.path.exists(pres_path):
+        try:
+            attachments["pres_table"] = read_presensie_to_table(pres_path)
+        except Exception as e:
+            attachments["pres_table"] = e
+    return attachments
+
+# ---------------- Parquet Mirror ---------------- #
+@st.cache_resource
+def _mirror_lock():
+    """Process-wide lock so only one session rewrites the Parquet mirror at a time."""
+    return threading.Lock()
+
+def _mirror_is_stale():
+    try:
+        return os.stat(PARQUET_FILE).st_mtime < os.stat(CSV_FILE).st_mtime
+    except FileNotFoundError:
+        return True
+
+def refresh_parquet_mirror(only_if_stale=False):
+    """Rewrite the Parquet mirror from the CSV: Datum parsed, loader columns filled and typed, newest first.
+
+    The new file is written beside the mirror and swapped in with os.replace, so
+    sessions reading it concurrently always see either the old or the new file."""
+    with _mirror_lock():
+        # Another session may have rebuilt the mirror while this one waited
+        if only_if_stale and not _mirror_is_stale():
+            return
+        _write_parquet_mirror()
+
+def _write_parquet_mirror():
+    df = pd.read_csv(CSV_FILE)
+    df["Datum"] = pd.to_datetime(df["Datum"], format="%Y-%m-%d", cache=True, errors="coerce")
+    df = df.reindex(columns=list(dict.fromkeys([*df.columns, *INTERVENTION_COLUMNS])))
+    # New rows store Aanwesigheid % at submit; fill it in for rows written before that
+    df["Aanwesigheid %"] = df["Aanwesigheid %"].fillna((df["Totaal Opgedaag"] / df["Totaal Genooi"] * 100).round(2))
+    # Stored as dictionary-encoded columns; read_database hands them out as categories
+    df = df.astype(CATEGORY_DTYPES)
+    # Stored newest first so readers never sort; the index keeps each row's CSV position
+    df = df.sort_values("Datum", ascending=False)
+    tmp_path = f"{PARQUET_FILE}.{uuid.uuid4().hex}.tmp"
+    try:
+        df.to_parquet(tmp_path, index=True)
+        os.replace(tmp_path, PARQUET_FILE)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def read_database(columns=None):
+    """Read the database from its Parquet mirror, rebuilding the mirror if the CSV is newer."""
+    if _mirror_is_stale():
+        refresh_parquet_mirror(only_if_stale=True)
+    df = pd.read_parquet(PARQUET_FILE, columns=columns)
+    # Parquet round-trips string categories but not integer ones such as Graad
+    return df.astype({col: dtype for col, dtype in CATEGORY_DTYPES.items() if col in df.columns})
 
 # ---------------- Load Intervention Data ---------------- #
 @st.cache_data(ttl=600)
-def load_intervention_data():
-    if not os.path.exists(CSV_FILE):
-        return pd.DataFrame()
-    df = pd.read_csv(CSV_FILE)
-    if df.empty:
-        return df
-    df["Datum"] = pd.to_datetime(df["Datum"], errors="coerce")
-    df["Aanwesigheid %"] = (df["Totaal Opgedaag"] / df["Totaal Genooi"] * 100).round(2)
-    return df.sort_values("Datum", ascending=False)
+def load_intervention_data(mtime):
+    return read_database(INTERVENTION_COLUMNS)
+
+# ---------------- Cached Word Report ---------------- #
+@st.cache_data(ttl=600, max_entries=4, show_spinner=False)
+def build_word_report(report_key, _df_to_export):
+    """Return cached report bytes; report_key covers the data version and every filter."""
+    return generate_word_report(_df_to_export)
 
-# ---------------- Load Raw Data for Filters and Deletion ---------------- #
+# ---------------- Sidebar Filter Options ---------------- #
 @st.cache_data(ttl=300)
-def load_raw():
-    if not os.path.exists(CSV_FILE):
-        return pd.DataFrame()
-    df = pd.read_csv(CSV_FILE)
+def sidebar_options(mtime):
+    """Return sorted (opvoeders, vakke) for the filter dropdowns; keyed on CSV mtime."""
+    df = load_intervention_data(mtime)
     if df.empty:
-        return df
-    df['Datum'] = pd.to_datetime(df['Datum'], errors='coerce')
-    return df.sort_values("Datum", ascending=False)
+        return [], []
+    # Categories are already the sorted distinct values, so no hash pass over the rows
+    return (
+        df['Opvoeder'].cat.categories.tolist(),
+        df['Vak'].cat.categories.tolist()
+    )
+
+# ---------------- Deletion Labels ---------------- #
+@st.cache_data(ttl=600)
+def build_entry_labels(mtime):
+    """Return the "ID n: datum - vak - opvoeder" labels for the deletion dropdown; keyed on CSV mtime."""
+    df = load_intervention_data(mtime)
+    if df.empty:
+        return []
+    return (
+        "ID " + df.index.astype(str) + ": " + df["Datum"].dt.strftime("%Y-%m-%d").fillna("")
+        + " - " + df["Vak"].astype(str) + " - " + df["Opvoeder"].astype(str)
+    ).tolist()
 
 # ---------------- UI ---------------- #
 st.title("HOËRSKOOL SAUL DAMON")
 st.subheader("📘 Intervensie Klasse")
 
+# Outcome of the most recent background GitHub sync
+gh_config = _gh_config()
+sync_status = _github_sync()["status"]
+if not gh_config:
+    st.warning("⚠️ GitHub konfigurasie ontbreek in secrets; data word slegs lokaal gestoor.")
+elif sync_status:
+    if sync_status["ok"]:
+        st.caption(f"✅ Laaste GitHub sinkronisasie: {sync_status['time']}")
+    else:
+        st.warning(f"⚠️ GitHub sinkronisasie om {sync_status['time']} het misluk; data is lokaal gestoor.")
+
 # Sidebar filters for Word report
 st.sidebar.header("Filters vir Verslag")
 filter_type = st.sidebar.selectbox("🔎 Kies tydsfilter", ["Alles", "Weekliks", "Maandeliks", "Kwartaalliks", "Jaarliks"]) 
 
-raw_df = load_raw()
+# Every loader is keyed on the CSV mtime, so any write invalidates their caches; this one stat
+# is the only database check a rerun makes. If the CSV vanished, recreate the layout first.
+try:
+    csv_mtime = os.stat(CSV_FILE).st_mtime
+except FileNotFoundError:
+    _ensure_layout.clear()
+    _ensure_layout()
+    csv_mtime = os.stat(CSV_FILE).st_mtime
+intervention_df = load_intervention_data(csv_mtime)
 
 # Options for filter selectors
-opvoeder_options = ['Alles'] + sorted(raw_df['Opvoeder'].dropna().unique().tolist()) if not raw_df.empty else ['Alles']
-vak_options = ['Alles'] + sorted(raw_df['Vak'].dropna().unique().tolist()) if not raw_df.empty else ['Alles']
+opvoeders, vakke = sidebar_options(csv_mtime)
+opvoeder_options = ['Alles'] + opvoeders
+vak_options = ['Alles'] + vakke
 graad_options = ['Alles'] + GRADE_OPTIONS
 
 selected_opvoeder = st.sidebar.selectbox("Opvoeder", opvoeder_options)
@@ -399,16 +749,20 @@ with st.form("data_form", clear_on_submit=True):
         else:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             foto_path = ""
+            foto_thumb_path = ""
             pres_foto_path = ""
+            pres_foto_thumb_path = ""
             pres_dokument_path = ""
 
             if foto:
                 foto_ext = os.path.splitext(foto.name)[1]
                 foto_path = os.path.join(FOTO_DIR, f"foto_{timestamp}{foto_ext}")
                 try:
-                    with open(foto_path, "wb") as f:
-                        f.write(foto.getbuffer())
+                    with open(foto_path, "wb", buffering=UPLOAD_CHUNK_SIZE) as f:
+                        foto.seek(0)
+                        shutil.copyfileobj(foto, f, UPLOAD_CHUNK_SIZE)
                     log_action("File Save Success", f"Photo saved: {foto_path}", "SUCCESS")
+                    foto_thumb_path = make_thumbnail(foto_path, os.path.join(FOTO_DIR, f"thumb_{timestamp}.jpg"))
                 except Exception as e:
                     log_action("File Save Failed", f"Photo save error: {str(e)}", "ERROR")
                     st.error(f"⚠️ Fout met foto stoor: {str(e)}")
@@ -418,9 +772,11 @@ with st.form("data_form", clear_on_submit=True):
                 pres_foto_ext = os.path.splitext(presensie_foto.name)[1]
                 pres_foto_path = os.path.join(PRES_DIR, f"presensie_foto_{timestamp}{pres_foto_ext}")
                 try:
-                    with open(pres_foto_path, "wb") as f:
-                        f.write(presensie_foto.getbuffer())
+                    with open(pres_foto_path, "wb", buffering=UPLOAD_CHUNK_SIZE) as f:
+                        presensie_foto.seek(0)
+                        shutil.copyfileobj(presensie_foto, f, UPLOAD_CHUNK_SIZE)
                     log_action("File Save Success", f"Presensie foto saved: {pres_foto_path}", "SUCCESS")
+                    pres_foto_thumb_path = make_thumbnail(pres_foto_path, os.path.join(PRES_DIR, f"presensie_thumb_{timestamp}.jpg"))
                 except Exception as e:
                     log_action("File Save Failed", f"Presensie foto save error: {str(e)}", "ERROR")
                     st.error(f"⚠️ Fout met presensielys foto stoor: {str(e)}")
@@ -430,8 +786,9 @@ with st.form("data_form", clear_on_submit=True):
                 pres_dokument_ext = os.path.splitext(presensie_dokument.name)[1]
                 pres_dokument_path = os.path.join(PRES_DIR, f"presensie_dokument_{timestamp}{pres_dokument_ext}")
                 try:
-                    with open(pres_dokument_path, "wb") as f:
-                        f.write(presensie_dokument.getbuffer())
+                    with open(pres_dokument_path, "wb", buffering=UPLOAD_CHUNK_SIZE) as f:
+                        presensie_dokument.seek(0)
+                        shutil.copyfileobj(presensie_dokument, f, UPLOAD_CHUNK_SIZE)
                     log_action("File Save Success", f"Presensie dokument saved: {pres_dokument_path}", "SUCCESS")
                 except Exception as e:
                     log_action("File Save Failed", f"Presensie dokument save error: {str(e)}", "ERROR")
@@ -448,14 +805,16 @@ with st.form("data_form", clear_on_submit=True):
                     "Eindtyd": eindtyd.strftime("%H:%M"),
                     "Totaal Genooi": int(totaal_genooi),
                     "Totaal Opgedaag": int(totaal_opgedaag),
+                    "Aanwesigheid %": round(int(totaal_opgedaag) / int(totaal_genooi) * 100, 2),
                     "Opvoeder": opvoeder,
                     "Foto": foto_path,
                     "Presensielys_Foto": pres_foto_path,
-                    "Presensielys_Dokument": pres_dokument_path
+                    "Presensielys_Dokument": pres_dokument_path,
+                    "FotoThumb": foto_thumb_path,
+                    "Presensielys_FotoThumb": pres_foto_thumb_path
                 }
-                df = pd.read_csv(CSV_FILE)
-                df = pd.concat([df, pd.DataFrame([new_entry])], ignore_index=True)
-                df.to_csv(CSV_FILE, index=False)
+                append_entry(CSV_FILE, new_entry)
+                refresh_parquet_mirror()
                 log_action("Database Update Success", f"Added entry for {datum.strftime('%Y-%m-%d')} - {vak}", "SUCCESS")
             except Exception as e:
                 log_action("Database Update Failed", f"CSV error: {str(e)}", "ERROR")
@@ -463,34 +822,23 @@ with st.form("data_form", clear_on_submit=True):
                 st.stop()
 
             try:
-                token = st.secrets.get("GITHUB_TOKEN")
-                repo = st.secrets.get("GITHUB_REPO")
-                if not token or not repo:
-                    log_action("GitHub Config Missing", f"Token: {bool(token)}, Repo: {bool(repo)}", "WARNING")
-                    st.warning("⚠️ GitHub konfigurasie ontbreek in secrets.")
-                elif upload_file_to_github(CSV_FILE, repo, "intervensie_database.csv", token):
-                    log_action("Sync Complete", "All operations successful", "SUCCESS")
-                    st.success("✅ Data gestoor en gesinkroniseer met GitHub!")
-                else:
-                    log_action("Sync Incomplete", "GitHub sync failed but data saved locally", "WARNING")
-                    st.warning("⚠️ Data lokaal gestoor, maar GitHub sinkronisasie misluk.")
-            except KeyError as e:
-                log_action("GitHub Secrets Error", f"Missing secret: {str(e)}", "ERROR")
-                st.error("⚠️ GitHub konfigurasie ontbreek in secrets!")
+                if gh_config:
+                    token, repo = gh_config
+                    queue_github_sync(CSV_FILE, repo, "intervensie_database.csv", token)
+                    st.success("✅ Data gestoor! GitHub sinkronisasie loop in die agtergrond.")
             except Exception as e:
                 log_action("GitHub Unexpected Error", f"Sync error: {str(e)}", "ERROR")
                 st.error(f"⚠️ Onverwagte GitHub fout: {str(e)}")
 
             # Clear cache and rerun to update log display immediately
             load_intervention_data.clear()
-            load_raw.clear()
+            sidebar_options.clear()
+            build_word_report.clear()
             st.rerun()
 
 # ---------------- Log Display (Intervention Data) ---------------- #
 st.subheader("📊 Intervensie Log Inskrywings")
 
-intervention_df = load_intervention_data()
-
 if 'intervention_page' not in st.session_state:
     st.session_state.intervention_page = 0
 
@@ -506,7 +854,6 @@ end_idx = min(start_idx + ENTRIES_PER_PAGE, total_entries)
 if intervention_df.empty:
     st.info("ℹ️ Geen intervensie inskrywings nie.")
 else:
-    log_action("Intervention Log Report Generated", f"Records: {len(intervention_df)}", "INFO")
     st.dataframe(
         intervention_df.iloc[start_idx:end_idx][["Datum", "Graad", "Vak", "Tema", "Begintyd", "Eindtyd", "Totaal Genooi", "Totaal Opgedaag", "Opvoeder", "Aanwesigheid %"]].reset_index(drop=True),
         column_config={
@@ -536,55 +883,47 @@ else:
 
 # ---------------- Load and Filter Intervention Data for Report and Deletion ---------------- #
 @st.cache_data(ttl=600)
-def load_and_filter_data(filter_type, opvoeder=None, vak=None, graad=None):
-    if not os.path.exists(CSV_FILE):
-        return pd.DataFrame()
-    df = pd.read_csv(CSV_FILE)
+def load_and_filter_data(mtime, filter_type, opvoeder=None, vak=None, graad=None):
+    df = read_database()
     if df.empty:
         return df
-    df["Datum"] = pd.to_datetime(df["Datum"], errors="coerce")
-    df["Aanwesigheid %"] = (df["Totaal Opgedaag"] / df["Totaal Genooi"] * 100).round(2)
-
-    today = datetime.today()
-    if filter_type == "Weekliks":
-        start = today - timedelta(days=7)
-        df = df[df["Datum"] >= start]
-    elif filter_type == "Maandeliks":
-        start = today - timedelta(days=30)
-        df = df[df["Datum"] >= start]
-    elif filter_type == "Kwartaalliks":
-        start = today - timedelta(days=90)
-        df = df[df["Datum"] >= start]
-    elif filter_type == "Jaarliks":
-        start = today - timedelta(days=365)
-        df = df[df["Datum"] >= start]
-
-    # Apply additional filters
-    if opvoeder and opvoeder != 'Alles':
-        df = df[df['Opvoeder'] == opvoeder]
-    if vak and vak != 'Alles':
-        df = df[df['Vak'] == vak]
-    if graad and graad != 'Alles':
-        df = df[df['Graad'] == graad]
-
-    return df.sort_values("Datum", ascending=False)
+
+    days = FILTER_DAYS.get(filter_type)
+    if days:
+        # The mirror is sorted newest first (NaT last): reversing the dated rows gives a
+        # sorted DatetimeIndex, so .loc slices the window by binary search instead of a mask.
+        start = datetime.today() - timedelta(days=days)
+        dated = df.iloc[:df["Datum"].count()].iloc[::-1].set_index("Datum", drop=False)
+        df = dated.loc[start:].iloc[::-1].reset_index(drop=True)
+
+    # Apply additional filters as one combined ndarray mask and a single selection
+    mask = True
+    for col, value in (("Opvoeder", opvoeder), ("Vak", vak), ("Graad", graad)):
+        if value and value != 'Alles':
+            mask = mask & (df[col] == value).to_numpy()
+    if mask is not True:
+        df = df[mask]
+
+    return df
 
 # Load filtered data for Word report
-df = load_and_filter_data(filter_type, selected_opvoeder, selected_vak, selected_graad)
+df = load_and_filter_data(csv_mtime, filter_type, selected_opvoeder, selected_vak, selected_graad)
 
 # ---------------- Deletion ---------------- #
 st.subheader("🗑️ Verwyder Intervensie Inskrywing")
-if not raw_df.empty:
-    entries = [f"ID {idx}: {row['Datum'].strftime('%Y-%m-%d')} - {row['Vak']} - {row['Opvoeder']}" for idx, row in raw_df.iterrows()]
+if not intervention_df.empty:
+    entries = build_entry_labels(csv_mtime)
     selected_entry = st.selectbox("Kies inskrywing om te verwyder", ["Geen"] + entries)
     if st.button("Bevestig Verwydering"):
         if selected_entry != "Geen":
             try:
                 idx = int(selected_entry.split(":")[0].split(" ")[1])
-                full_df = pd.read_csv(CSV_FILE)
+                # Rewrite the file of record from itself, every cell kept as its original text
+                full_df = pd.read_csv(CSV_FILE, dtype=str, keep_default_na=False)
                 row_to_delete = full_df.loc[idx]
                 full_df = full_df.drop(idx).reset_index(drop=True)
                 full_df.to_csv(CSV_FILE, index=False)
+                refresh_parquet_mirror()
 
                 # Delete associated files
                 if pd.notna(row_to_delete['Foto']) and os.path.exists(row_to_delete['Foto']):
@@ -596,18 +935,23 @@ if not raw_df.empty:
                 if pd.notna(row_to_delete['Presensielys_Dokument']) and os.path.exists(row_to_delete['Presensielys_Dokument']):
                     os.remove(row_to_delete['Presensielys_Dokument'])
                     log_action("File Delete Success", f"Presensielys dokument deleted: {row_to_delete['Presensielys_Dokument']}", "SUCCESS")
+                for thumb_col in ["FotoThumb", "Presensielys_FotoThumb"]:
+                    thumb = row_to_delete.get(thumb_col)
+                    if pd.notna(thumb) and os.path.exists(thumb):
+                        os.remove(thumb)
+                        log_action("File Delete Success", f"Thumbnail deleted: {thumb}", "SUCCESS")
 
                 # Sync to GitHub
-                token = st.secrets.get("GITHUB_TOKEN")
-                repo = st.secrets.get("GITHUB_REPO")
-                if token and repo:
-                    upload_file_to_github(CSV_FILE, repo, "intervensie_database.csv", token)
+                if gh_config:
+                    token, repo = gh_config
+                    queue_github_sync(CSV_FILE, repo, "intervensie_database.csv", token)
 
                 st.success("✅ Inskrywing suksesvol verwyder!")
                 log_action("Deletion Success", f"Deleted ID {idx}", "SUCCESS")
                 load_and_filter_data.clear()
-                load_raw.clear()
                 load_intervention_data.clear()
+                sidebar_options.clear()
+                build_word_report.clear()
                 st.rerun()  # Rerun to update log display after deletion
             except Exception as e:
                 st.error(f"⚠️ Fout met verwydering: {str(e)}")
@@ -628,35 +972,35 @@ def generate_word_report(df_to_export):
     if not df_to_export.empty:
         # Summary table
         columns = ["Datum", "Graad", "Vak", "Tema", "Begintyd", "Eindtyd", "Totaal Genooi", "Totaal Opgedaag", "Opvoeder", "Aanwesigheid %"]
-        table = doc.add_table(rows=1, cols=len(columns))
-        hdr_cells = table.rows[0].cells
-        for i, col in enumerate(columns):
-            hdr_cells[i].text = col
-
-        for _, row in df_to_export.iterrows():
-            row_cells = table.add_row().cells
-            row_cells[0].text = row['Datum'].strftime('%Y-%m-%d')
-            row_cells[1].text = str(row['Graad'])
-            row_cells[2].text = row['Vak']
-            row_cells[3].text = row['Tema']
-            row_cells[4].text = str(row.get('Begintyd', 'NVT'))
-            row_cells[5].text = str(row.get('Eindtyd', 'NVT'))
-            row_cells[6].text = str(row['Totaal Genooi'])
-            row_cells[7].text = str(row['Totaal Opgedaag'])
-            row_cells[8].text = row['Opvoeder']
-            row_cells[9].text = f"{row['Aanwesigheid %']:.2f}%"
+        table = doc.add_table(rows=0, cols=len(columns))
+        append_table_rows(table, [columns])
+
+        # Format whole columns up front instead of cell by cell in the row loops
+        formatted = df_to_export.assign(**{
+            "Datum": df_to_export["Datum"].dt.strftime('%Y-%m-%d'),
+            "Aanwesigheid %": df_to_export["Aanwesigheid %"].map("{:.2f}%".format)
+        })
+        append_table_rows(table, formatted.reindex(columns=columns, fill_value='NVT').astype(str).values.tolist())
 
         doc.add_paragraph("")
         doc.add_heading("Details met Fotos en Presensielyste", level=2)
 
-        for _, row in df_to_export.iterrows():
-            doc.add_heading(f"Inskrywing: {row['Datum'].strftime('%Y-%m-%d')} - {row['Vak']} - {row.get('Begintyd', 'NVT')} tot {row.get('Eindtyd', 'NVT')}", level=3)
+        # Disk reads run in parallel; the Document itself is only touched from this thread
+        records = list(formatted.reindex(columns=DETAIL_COLUMNS).itertuples(index=False, name="Inskrywing"))
+        with ThreadPoolExecutor(max_workers=REPORT_PREFETCH_WORKERS) as executor:
+            prefetched = list(executor.map(prefetch_attachments, records))
+
+        for row, attachments in zip(records, prefetched):
+            doc.add_heading(f"Inskrywing: {row.Datum} - {row.Vak} - {row.Begintyd} tot {row.Eindtyd}", level=3)
 
-            # Foto insertion
-            if pd.notna(row.get('Foto')) and os.path.exists(row['Foto']):
+            # Foto insertion (pre-resized thumbnail when available)
+            foto = attachments["foto"]
+            if foto is not None:
                 try:
                     doc.add_paragraph('Foto:')
-                    doc.add_picture(row['Foto'], width=Inches(2))
+                    if isinstance(foto, Exception):
+                        raise foto
+                    doc.add_picture(BytesIO(foto), width=Inches(2))
                 except Exception as e:
                     doc.add_paragraph(f"⚠️ Kon nie foto laai nie: {str(e)}")
             else:
@@ -664,9 +1008,12 @@ def generate_word_report(df_to_export):
 
             # Presensielys Foto insertion
             doc.add_paragraph('Presensielys Foto:')
-            if pd.notna(row.get('Presensielys_Foto')) and os.path.exists(row['Presensielys_Foto']):
+            pres_foto = attachments["pres_foto"]
+            if pres_foto is not None:
                 try:
-                    doc.add_picture(row['Presensielys_Foto'], width=Inches(2))
+                    if isinstance(pres_foto, Exception):
+                        raise pres_foto
+                    doc.add_picture(BytesIO(pres_foto), width=Inches(2))
                 except Exception as e:
                     doc.add_paragraph(f"⚠️ Kon nie presensielys foto laai nie: {str(e)}")
             else:
@@ -674,20 +1021,18 @@ def generate_word_report(df_to_export):
 
             # Presensielys Dokument handling
             doc.add_paragraph('Presensielys Dokument:')
-            if pd.notna(row.get('Presensielys_Dokument')) and os.path.exists(row['Presensielys_Dokument']):
-                pres_path = row['Presensielys_Dokument']
+            if pd.notna(row.Presensielys_Dokument) and os.path.exists(row.Presensielys_Dokument):
+                pres_path = row.Presensielys_Dokument
                 ext = pres_path.split('.')[-1].lower()
                 if ext in ['csv', 'xls', 'xlsx']:
-                    df_p = read_presensie_to_table(pres_path)
+                    df_p = attachments["pres_table"]
+                    if isinstance(df_p, Exception):
+                        log_action("Presensie Read Failed", f"{pres_path} - {str(df_p)}", "WARNING")
+                        df_p = None
                     if df_p is not None and not df_p.empty:
-                        sub_table = doc.add_table(rows=1, cols=min(len(df_p.columns), 10))
-                        sub_hdr_cells = sub_table.rows[0].cells
-                        for i, col_name in enumerate(df_p.columns[:10]):
-                            sub_hdr_cells[i].text = str(col_name)
-                        for _, prow in df_p.iterrows():
-                            sub_row_cells = sub_table.add_row().cells
-                            for i, val in enumerate(prow[:10]):
-                                sub_row_cells[i].text = str(val)
+                        sub_table = doc.add_table(rows=0, cols=min(len(df_p.columns), 10))
+                        append_table_rows(sub_table, [df_p.columns[:10]])
+                        append_table_rows(sub_table, df_p.iloc[:, :10].values.tolist())
                         if len(df_p) >= 50:
                             doc.add_paragraph('... (tabel afgekort — slegs die eerste rye getoon)')
                     else:
@@ -706,12 +1051,20 @@ def generate_word_report(df_to_export):
     buffer.seek(0)
     return buffer.getvalue()
 
+def word_report_bytes():
+    """Build the report when the download button is clicked, not on every rerun."""
+    try:
+        return build_word_report(report_key, df)
+    except Exception as e:
+        log_action("Word Report Download Failed", f"Error: {str(e)}", "ERROR")
+        raise
+
 # Download button for Word report
 try:
-    doc_bytes = generate_word_report(df)
+    report_key = (csv_mtime, filter_type, selected_opvoeder, selected_vak, selected_graad, datetime.today().date())
     st.download_button(
         label="⬇️ Laai Intervensie Verslag af (Word)",
-        data=doc_bytes,
+        data=word_report_bytes,
         file_name=f"intervensie_report_{datetime.now().strftime('%Y%m%d')}.docx",
         mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         key="download_word_report"